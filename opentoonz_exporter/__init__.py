@@ -7,32 +7,55 @@ import os
 from krita import Krita, Extension
 
 from .config import PLUGIN_ID, PLUGIN_NAME
-from .qt_compat import QIcon
+from .qt_compat import QIcon, QApplication
 
+# Sentinel for an icon that has not been looked up yet
+_ICON_NOT_LOADED = object()
+_cached_icon = _ICON_NOT_LOADED
 
-def _get_plugin_icon():
-    """Get the plugin icon based on the current theme."""
+
+def _detect_theme():
+    """Detect whether Krita is using a dark or light theme.
+    
+    Returns:
+        "dark" or "light", or None if the palette could not be read.
+    """
     try:
-        from .qt_compat import QApplication
-        
-        # Determine if using dark or light theme
         palette = QApplication.palette()
         bg_lightness = palette.window().color().lightness()
-        is_dark = bg_lightness < 128
-        theme = "dark" if is_dark else "light"
-        
-        # Build path to icon
-        plugin_dir = os.path.dirname(__file__)
-        icon_path = os.path.join(plugin_dir, "icons", f"opentoonz-export-{theme}.svg")
-        
-        if os.path.exists(icon_path):
-            return QIcon(icon_path)
-    except Exception:
-        pass
+    except (RuntimeError, AttributeError):
+        return None
+    return "dark" if bg_lightness < 128 else "light"
+
+
+def _load_icon(theme):
+    """Load the plugin icon for a theme.
     
+    Returns:
+        The QIcon, or None if the icon file does not exist.
+    """
+    # Build path to icon
+    plugin_dir = os.path.dirname(__file__)
+    icon_path = os.path.join(plugin_dir, "icons", f"opentoonz-export-{theme}.svg")
+    
+    if os.path.exists(icon_path):
+        return QIcon(icon_path)
     return None
 
 
+def _get_plugin_icon():
+    """Get the plugin icon based on the current theme.
+    
+    The theme is detected and the icon loaded on the first call only;
+    later windows reuse the cached result.
+    """
+    global _cached_icon
+    if _cached_icon is _ICON_NOT_LOADED:
+        theme = _detect_theme()
+        _cached_icon = _load_icon(theme) if theme is not None else None
+    return _cached_icon
+
+
 class OpenToonzExporterExtension(Extension):
     """Extension that adds OpenToonz export to Krita's Tools menu."""
     
@@ -71,7 +94,7 @@ class OpenToonzExporterExtension(Extension):
         except:
             pass
         
-        dialog = OpenToonzExportDialog(main_window)
+        dialog = OpenToonzExportDialog.get_or_create(main_window)
         dialog.exec()
 
 
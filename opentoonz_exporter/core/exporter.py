@@ -4,11 +4,23 @@ Main export logic for converting Krita animations to OpenToonz scene format.
 """
 
 import os
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from .document import get_document_info
-from .layer import get_animated_layers, get_static_layers, get_layer_keyframes, count_total_keyframes, is_stop_frame
+from .layer import partition_layers, get_all_layer_keyframes, is_stop_frame, is_transparent
 from .frame_export import FrameExporter
-from .utils import mkdir, sanitize_filename, int_to_str, make_unique_name, compute_content_hash
+from .utils import (
+    mkdir, sanitize_filename, int_to_str, NameRegistry, FrameDeduplicator,
+    load_hash_cache, save_hash_cache, clear_hash_cache
+)
+
+# Maximum number of PNG encode threads; rendering in Krita needs cores too
+MAX_ENCODE_WORKERS = 4
+
+# Maximum pixel data held by queued PNG encodes, in bytes
+MAX_PENDING_ENCODE_BYTES = 256 * 1024 * 1024
 
 
 class ExportOptions:
@@ -26,6 +38,8 @@ class ExportOptions:
         self.flatten_groups = True
         self.scene_name = ""
         self.level_type = self.LEVEL_RASTER  # For future expansion
+        # Frames are intermediates for OpenToonz, so favor encode speed over size
+        self.png_compression = 3
 
 
 class ExportResult:
@@ -53,8 +67,58 @@ class LayerExportInfo:
         self.name = name
         self.folder_path = folder_path
         self.level_type = level_type
-        self.frame_data = []  # List of (xsheet_row, frame_id) tuples
+        # Held runs of xsheet cells, stored as parallel arrays (end row inclusive)
+        self.run_starts = array('i')
+        self.run_ends = array('i')
+        self.frame_ids = array('i')
         self.file_pattern = ""  # e.g., "LayerName..png" for sequence
+    
+    def add_run(self, start_row: int, end_row: int, frame_id: int) -> None:
+        """Hold a frame over a range of xsheet rows.
+        
+        Merges with the previous run if it holds the same frame and ends
+        right before start_row.
+        
+        Args:
+            start_row: First xsheet row (0-indexed).
+            end_row: Last xsheet row (inclusive).
+            frame_id: Frame ID to show in these rows.
+        """
+        if self.frame_ids and self.frame_ids[-1] == frame_id and self.run_ends[-1] + 1 == start_row:
+            self.run_ends[-1] = end_row
+            return
+        self.run_starts.append(start_row)
+        self.run_ends.append(end_row)
+        self.frame_ids.append(frame_id)
+    
+    def runs(self):
+        """Iterate over held runs.
+        
+        Returns:
+            Iterator of (start_row, end_row, frame_id) tuples, end row inclusive.
+        """
+        return zip(self.run_starts, self.run_ends, self.frame_ids)
+
+
+class _LayerExportState:
+    """Per-layer progress while animated layers are exported frame by frame."""
+    
+    def __init__(self, layer, info: LayerExportInfo, deduplicator: FrameDeduplicator):
+        self.layer = layer
+        self.info = info
+        self.deduplicator = deduplicator
+        self.layer_id = layer.uniqueId().toString()  # Hash cache key
+        # Whether the projection's alpha can be checked for erased keyframes
+        self.is_rgba8 = layer.colorModel() == "RGBA" and layer.colorDepth() == "U8"
+        self.filename_prefix = f"{info.name}."
+        self.current_frame_id = None  # Frame held since run_start, None for no cell
+        self.run_start = 0
+        self.frame_counter = 0
+        self.cached_frame_ids = {}  # PNG path reused from the hash cache -> frame_id
+    
+    def frame_path(self, frame_id: int) -> str:
+        """Get the PNG path of a frame: LayerName.0001.png (same padding as int_to_str)."""
+        return os.path.join(self.info.folder_path, f"{self.filename_prefix}{frame_id:04d}.png")
 
 
 class OpenToonzExportEngine:
@@ -83,6 +147,10 @@ class OpenToonzExportEngine:
         # Export state
         self._result = ExportResult()
         self._layer_infos = []  # List of LayerExportInfo
+        self._frame_exporter = None
+        self._encode_pool = None
+        self._pending_encodes = deque()  # (future, error_message, size) tuples
+        self._pending_bytes = 0  # Total size of the queued pixel data
     
     def export(self) -> ExportResult:
         """Execute the export operation.
@@ -102,6 +170,18 @@ class OpenToonzExportEngine:
         except Exception as e:
             self._result.success = False
             self._result.error_message = str(e)
+        finally:
+            # Finish queued PNG encodes before returning
+            if self._encode_pool is not None:
+                self._encode_pool.shutdown(wait=True)
+                self._encode_pool = None
+                self._pending_encodes.clear()
+                self._pending_bytes = 0
+            
+            # Release pooled temporary documents
+            if self._frame_exporter is not None:
+                self._frame_exporter.close()
+                self._frame_exporter = None
         
         return self._result
     
@@ -122,10 +202,81 @@ class OpenToonzExportEngine:
         """Check if export was cancelled."""
         return self.on_cancelled and self.on_cancelled()
     
+    def _collect_encodes(self, max_bytes: int = 0) -> str:
+        """Wait for queued PNG encodes until they hold at most max_bytes.
+        
+        Args:
+            max_bytes: Pixel data the remaining encodes may still hold.
+            
+        Returns:
+            Error message of the first failed encode, or empty string.
+        """
+        while self._pending_encodes and self._pending_bytes > max_bytes:
+            future, error_message, size = self._pending_encodes.popleft()
+            self._pending_bytes -= size
+            if not future.result():
+                return error_message
+        return ""
+    
+    def _get_document_stamp(self):
+        """Identify the saved version of the document file.
+        
+        The size is included because filesystems with coarse timestamps
+        can give two saves within a second or two the same mtime.
+        
+        Returns:
+            Tuple (mtime_ns, size) of the file, or None if the document was
+            never saved or has unsaved changes, in which case the hash cache
+            can't be trusted.
+        """
+        file_name = self.document.fileName()
+        if not file_name or self.document.modified():
+            return None
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _reuse_cached_frame(self, state: _LayerExportState, frame: int,
+                            content_hash, path) -> bool:
+        """Apply a keyframe recorded by a previous export without rendering it.
+        
+        Args:
+            state: The layer's export state.
+            frame: The keyframe's frame number.
+            content_hash: Content hash from the hash cache (None for a stop
+                frame).
+            path: PNG path from the hash cache (None for a stop frame).
+            
+        Returns:
+            True if the keyframe was applied, False if it must be rendered.
+        """
+        if content_hash is None:
+            # Cached stop frame
+            state.current_frame_id = None
+            return True
+        
+        # Clone of a frame already reused from the cache
+        frame_id = state.cached_frame_ids.get(path)
+        if frame_id is None:
+            # New content: only reusable if it lands on the same file again
+            frame_id = state.frame_counter + 1
+            if path != state.frame_path(frame_id) or not os.path.isfile(path):
+                return False
+            state.frame_counter = frame_id
+            state.cached_frame_ids[path] = frame_id
+            state.deduplicator.add(content_hash, frame_id)
+            self._result.frame_count += 1
+        
+        state.current_frame_id = frame_id
+        return True
+    
     def _run_export(self):
         """Internal export implementation."""
         # Gather document info
         doc_info = get_document_info(self.document)
+        width, height = doc_info['width'], doc_info['height']
         
         # Determine scene name
         scene_name = self.options.scene_name
@@ -138,22 +289,17 @@ class OpenToonzExportEngine:
         scene_folder = os.path.join(self.export_path, scene_name)
         mkdir(scene_folder)
         
-        # Get exportable animated layers
-        animated_layers = get_animated_layers(
+        # Get exportable animated and static layers (as LayerRecords) in one walk
+        animated_layers, static_layers = partition_layers(
             self.document,
             self.options.include_invisible,
             self.options.include_reference,
             self.options.flatten_groups
         )
         
-        # Get static layers if requested
-        static_layers = []
-        if self.options.include_static:
-            static_layers = get_static_layers(
-                self.document,
-                self.options.include_invisible,
-                self.options.include_reference
-            )
+        # Static layers are only exported if requested
+        if not self.options.include_static:
+            static_layers = []
         
         if not animated_layers and not static_layers:
             self._result.error_message = "No layers found to export. Check that layers have animation keyframes or enable 'Include non-animated layers' option."
@@ -164,20 +310,48 @@ class OpenToonzExportEngine:
         end_frame = doc_info['end_frame']
         duration = doc_info['duration']
         
+        # Query each layer's keyframes once; reused for progress and export
+        layer_keyframes = get_all_layer_keyframes(animated_layers, start_frame, end_frame)
+        
         # Count total work for progress reporting
-        total_keyframes = count_total_keyframes(animated_layers, start_frame, end_frame)
+        total_keyframes = sum(len(keyframes) for keyframes in layer_keyframes)
+        
+        # Frames recorded by the last export of this saved document can be
+        # reused without rendering. Unsaved changes invalidate the cache.
+        document_stamp = self._get_document_stamp()
+        hash_cache = {}
+        if document_stamp is not None:
+            hash_cache = load_hash_cache(
+                scene_folder, document_stamp, self.options.png_compression
+            )
+        # The cache is only rewritten once this export succeeds, so a failed
+        # or cancelled export can't leave entries for missing files behind
+        clear_hash_cache(scene_folder)
+        cache_rows = []  # (state, frame, frame_id or None for a stop frame) of this export
         
         # Initialize the frame exporter
-        frame_exporter = FrameExporter(self.document)
+        frame_exporter = FrameExporter(self.document, self.options.png_compression)
+        self._frame_exporter = frame_exporter
         
-        # Process each animated layer
+        # Encode PNGs on worker threads when they can bypass Krita; rendering
+        # must stay on this thread. Queued encodes are bounded by the size of
+        # the pixel data they hold to limit memory.
+        if frame_exporter.supports_direct_export:
+            workers = min(MAX_ENCODE_WORKERS, os.cpu_count() or 1)
+            self._encode_pool = ThreadPoolExecutor(max_workers=workers)
+        
+        # Prepare each animated layer and group its keyframes by frame
         processed = 0
-        used_layer_names = set()
+        layer_names = NameRegistry()
+        layer_states = []
+        keyframes_by_frame = {}  # frame -> list of _LayerExportState
         
-        for col_index, layer in enumerate(animated_layers):
+        for record, keyframes in zip(animated_layers, layer_keyframes):
+            layer = record.node
+            
             # Generate unique layer name
-            base_name = sanitize_filename(layer.name())
-            layer_name = make_unique_name(base_name, used_layer_names)
+            base_name = sanitize_filename(record.name)
+            layer_name = layer_names.make_unique(base_name)
             
             # Create layer folder: SceneName/LayerName/
             layer_folder = os.path.join(scene_folder, layer_name)
@@ -192,91 +366,129 @@ class OpenToonzExportEngine:
             # OpenToonz uses ".." for frame number placeholder in sequences
             layer_info.file_pattern = f"{layer_name}..png"
             
-            # Get keyframes for this layer
-            keyframes = get_layer_keyframes(layer, start_frame, end_frame)
-            
-            # For deduplication: map content hash -> frame_id
+            # For deduplication: map content -> frame_id
             # This handles clone keyframes (exposures) by reusing the same frame
-            hash_to_frame_id = {}
+            state = _LayerExportState(layer, layer_info, FrameDeduplicator())
+            layer_states.append(state)
             
-            # Track which frame image each xsheet row should show
-            current_frame_id = None
-            frame_counter = 0
+            for frame in keyframes:
+                keyframes_by_frame.setdefault(frame, []).append(state)
+        
+        # Visit each keyframe time once and export every layer keyed there.
+        # Rows between keyframes are covered by the held runs.
+        for frame in sorted(keyframes_by_frame):
+            # Check for cancellation
+            if self._is_cancelled():
+                self._result.error_message = "Export cancelled by user"
+                return
             
-            for frame in range(start_frame, end_frame + 1):
-                # Check for cancellation
-                if self._is_cancelled():
-                    self._result.error_message = "Export cancelled by user"
-                    return
+            # Calculate xsheet row (0-indexed)
+            xsheet_row = frame - start_frame
+            frame_states = keyframes_by_frame[frame]
+            
+            # The document is set to this frame once a layer needs rendering
+            time_synced = False
+            
+            for state in frame_states:
+                layer = state.layer
+                layer_info = state.info
                 
-                # Calculate xsheet row (0-indexed)
-                xsheet_row = frame - start_frame
+                # Close the run held since the previous keyframe
+                if state.current_frame_id is not None:
+                    layer_info.add_run(state.run_start, xsheet_row - 1, state.current_frame_id)
+                state.run_start = xsheet_row
                 
-                # Check if this frame has a keyframe
-                if frame in keyframes:
-                    # Report progress
-                    processed += 1
-                    self._report_progress(
-                        processed,
-                        total_keyframes,
-                        f"Exporting {layer_name} - frame {frame}..."
-                    )
-                    
-                    # Set document to this frame
+                # Report progress
+                processed += 1
+                self._report_progress(
+                    processed,
+                    total_keyframes,
+                    f"Exporting {layer_info.name} - frame {frame}..."
+                )
+                
+                # Skip rendering if the last export recorded this keyframe
+                cached = hash_cache.get((state.layer_id, frame))
+                if cached is not None and self._reuse_cached_frame(state, frame, *cached):
+                    cache_rows.append((state, frame, state.current_frame_id))
+                    continue
+                
+                if not time_synced:
                     self.document.setCurrentTime(frame)
                     self.document.waitForDone()
-                    
-                    # Check for stop frame (blank keyframe)
-                    if is_stop_frame(layer):
-                        current_frame_id = None  # Clear - no cell
-                        continue
-                    
+                    time_synced = True
+                
+                # Check for stop frame (blank keyframe) before reading pixels
+                stop_frame = is_stop_frame(layer)
+                if not stop_frame:
                     # Get pixel data for content deduplication
                     pixel_data = layer.projectionPixelData(
-                        0, 0, doc_info['width'], doc_info['height']
+                        0, 0, width, height
                     )
-                    content_hash = compute_content_hash(pixel_data)
-                    
-                    # Check if we've already exported this exact content
-                    if content_hash in hash_to_frame_id:
-                        # Reuse existing frame_id (clone keyframe / exposure)
-                        current_frame_id = hash_to_frame_id[content_hash]
-                    else:
-                        # New unique content - export it
-                        frame_counter += 1
-                        frame_id = frame_counter  # 1-based frame IDs
-                        
-                        # Filename: LayerName.0001.png
-                        filename = f"{layer_name}.{int_to_str(frame_id)}.png"
-                        filepath = os.path.join(layer_folder, filename)
-                        
-                        success = frame_exporter.export_frame(layer, frame, filepath)
-                        
-                        if not success:
-                            self._result.error_message = f"Failed to export frame {frame} of {layer_name}"
-                            return
-                        
-                        # Record hash for future deduplication
-                        hash_to_frame_id[content_hash] = frame_id
-                        current_frame_id = frame_id
-                        self._result.frame_count += 1
+                    # Keyframes erased to full transparency are stop frames too
+                    stop_frame = state.is_rgba8 and is_transparent(pixel_data)
+                
+                if stop_frame:
+                    state.current_frame_id = None  # Clear - no cell
+                    cache_rows.append((state, frame, None))
+                    continue
                 
-                # Add frame data for xsheet (even if held from previous keyframe)
-                if current_frame_id is not None:
-                    layer_info.frame_data.append((xsheet_row, current_frame_id))
+                existing_frame_id, content_hash = state.deduplicator.find(pixel_data)
+                
+                # Check if we've already exported this exact content
+                if existing_frame_id is not None:
+                    # Reuse existing frame_id (clone keyframe / exposure)
+                    state.current_frame_id = existing_frame_id
+                    cache_rows.append((state, frame, existing_frame_id))
+                    continue
+                
+                # New unique content - export it
+                state.frame_counter += 1
+                frame_id = state.frame_counter  # 1-based frame IDs
+                filepath = state.frame_path(frame_id)
+                
+                error_message = f"Failed to export frame {frame} of {layer_info.name}"
+                if self._encode_pool is not None:
+                    future = self._encode_pool.submit(
+                        frame_exporter.export_frame_direct, pixel_data, filepath
+                    )
+                    size = len(pixel_data)
+                    self._pending_encodes.append((future, error_message, size))
+                    self._pending_bytes += size
+                    error_message = self._collect_encodes(MAX_PENDING_ENCODE_BYTES)
+                    if error_message:
+                        self._result.error_message = error_message
+                        return
+                elif not frame_exporter.export_frame(
+                    layer, frame, filepath, pixel_data
+                ):
+                    self._result.error_message = error_message
+                    return
+                
+                # Record content for future deduplication
+                state.deduplicator.add(content_hash, frame_id)
+                state.current_frame_id = frame_id
+                self._result.frame_count += 1
+                cache_rows.append((state, frame, frame_id))
+        
+        for state in layer_states:
+            # Hold the last keyframe until the end of the scene
+            if state.current_frame_id is not None:
+                state.info.add_run(state.run_start, duration - 1, state.current_frame_id)
             
-            self._layer_infos.append(layer_info)
+            self._layer_infos.append(state.info)
         
         # Process static layers (held from first to last frame)
-        for layer in static_layers:
+        for record in static_layers:
+            layer = record.node
+            
             # Check for cancellation
             if self._is_cancelled():
                 self._result.error_message = "Export cancelled by user"
                 return
             
             # Generate unique layer name
-            base_name = sanitize_filename(layer.name())
-            layer_name = make_unique_name(base_name, used_layer_names)
+            base_name = sanitize_filename(record.name)
+            layer_name = layer_names.make_unique(base_name)
             
             # Report progress
             self._report_progress(
@@ -315,12 +527,27 @@ class OpenToonzExportEngine:
             self._result.frame_count += 1
             
             # Hold frame 1 for the entire duration
-            for frame in range(start_frame, end_frame + 1):
-                xsheet_row = frame - start_frame
-                layer_info.frame_data.append((xsheet_row, 1))  # Always frame 1
+            layer_info.add_run(0, duration - 1, 1)
             
             self._layer_infos.append(layer_info)
         
+        # Wait for all queued PNG encodes and file writes
+        error_message = self._collect_encodes()
+        if error_message:
+            self._result.error_message = error_message
+            return
+        frame_exporter.wait_for_writes()
+        
+        # Remember this export's frames once they are all on disk
+        if document_stamp is not None:
+            compression = self.options.png_compression
+            save_hash_cache(scene_folder, document_stamp, compression, (
+                (state.layer_id, frame, None, None) if frame_id is None else
+                (state.layer_id, frame, state.deduplicator.get_hash(frame_id),
+                 state.frame_path(frame_id))
+                for state, frame, frame_id in cache_rows
+            ))
+        
         # Store scene info for script generation
         self._result.success = True
         self._result.output_path = os.path.join(scene_folder, f"{scene_name}.tnz")
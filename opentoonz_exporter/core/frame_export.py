@@ -1,27 +1,46 @@
 """Frame Export Handler
 
 Handles the export of individual animation frames to PNG files.
-Uses Krita's native document export for proper color management.
+Uses Krita's native document export for proper color management, or
+writes 8-bit sRGB frames directly with Pillow when it is available.
 """
 
+import io
+import queue
+import threading
+
 import krita
 
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Profiles whose frames Krita exports as plain untagged sRGB PNGs
+SRGB_PROFILES = ("sRGB-elle-V2-srgbtrc.icc", "sRGB built-in")
+
+# Maximum number of encoded PNGs waiting to be written to disk
+WRITE_QUEUE_SIZE = 8
+
 
 class FrameExporter:
     """Exports individual layer frames using temporary documents.
     
-    Creates isolated temporary documents for each frame export to ensure
-    clean output with proper color profile handling.
+    Uses isolated temporary documents for frame export to ensure clean
+    output with proper color profile handling. Temporary documents are
+    pooled and reused across frames; call close() when done exporting.
     """
     
-    def __init__(self, source_document):
+    def __init__(self, source_document, compression: int = 3):
         """Initialize with the source document to export from.
         
         Args:
             source_document: The Krita document containing layers to export.
+            compression: PNG compression level (0-9).
         """
         self.source = source_document
         self.krita_instance = krita.Krita.instance()
+        self._compression = compression
         
         # Cache document properties for creating matching temp documents
         self._width = source_document.width()
@@ -30,31 +49,120 @@ class FrameExporter:
         self._color_depth = source_document.colorDepth()
         self._color_profile = source_document.colorProfile()
         self._resolution = source_document.resolution()
+        
+        # Temporary documents available for reuse
+        self._temp_pool = []
+        
+        # Export configuration shared by all frames
+        self._png_config = self._build_png_config()
+        
+        # Background writer for PNGs encoded by export_frame_direct
+        self._write_queue = None
+        self._writer_thread = None
+        self._write_error = None
+        if self.supports_direct_export:
+            self._write_queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+            self._writer_thread = threading.Thread(target=self._write_files, daemon=True)
+            self._writer_thread.start()
+    
+    @property
+    def supports_direct_export(self) -> bool:
+        """Whether export_frame_direct can be used for this document.
+        
+        Requires Pillow and an 8-bit RGBA sRGB document, whose pixel data
+        maps directly onto a PNG without color conversion or an embedded
+        profile.
+        """
+        return (Image is not None
+                and self._color_model == "RGBA" and self._color_depth == "U8"
+                and self._color_profile in SRGB_PROFILES)
     
-    def export_frame(self, layer, frame_number: int, output_path: str) -> bool:
+    def export_frame_direct(self, pixel_data: bytes, output_path: str) -> bool:
+        """Encode pixel data to a PNG file with Pillow.
+        
+        Bypasses the temporary document entirely. Does not touch any Krita
+        objects, so it is safe to call from a worker thread. Only valid when
+        supports_direct_export is True.
+        
+        The PNG is encoded in memory and written by a background thread, so
+        the caller can move on to the next frame while it reaches the disk.
+        Call wait_for_writes() to make sure all files have been written.
+        
+        Args:
+            pixel_data: Raw BGRA pixel bytes at full document size.
+            output_path: Full path for the output PNG file.
+            
+        Returns:
+            True if the frame was encoded and queued for writing.
+        """
+        image = Image.frombuffer(
+            "RGBA", (self._width, self._height), pixel_data, "raw", "BGRA", 0, 1
+        )
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG", compress_level=self._compression)
+        self._write_queue.put((output_path, buffer.getvalue()))
+        return True
+    
+    def wait_for_writes(self) -> None:
+        """Block until all PNGs queued by export_frame_direct are written.
+        
+        Raises:
+            OSError: If writing any of the queued files failed.
+        """
+        if self._write_queue is not None:
+            self._write_queue.join()
+        if self._write_error is not None:
+            raise self._write_error
+    
+    def _write_files(self) -> None:
+        """Write queued PNG data to disk until a None entry is received."""
+        while True:
+            item = self._write_queue.get()
+            try:
+                if item is None:
+                    return
+                # Skip remaining writes after a failure; it is reported once
+                if self._write_error is None:
+                    output_path, data = item
+                    with open(output_path, 'wb') as f:
+                        f.write(data)
+            except OSError as e:
+                self._write_error = e
+            finally:
+                self._write_queue.task_done()
+    
+    def export_frame(self, layer, frame_number: int, output_path: str,
+                     pixel_data: bytes = None) -> bool:
         """Export a single frame from a layer to a PNG file.
         
-        Creates a temporary document matching the source document's properties,
-        transfers the pixel data, and exports using Krita's native export.
+        Uses export_frame_direct when supported. Otherwise uses a temporary
+        document matching the source document's properties, transfers the
+        pixel data, and exports using Krita's native export.
         
         Args:
             layer: The Krita layer node to export from.
             frame_number: Which frame to export.
             output_path: Full path for the output PNG file.
+            pixel_data: Pixel data already read from the layer at frame_number.
+                If given, the frame is not rendered and read again.
             
         Returns:
             True if export succeeded, False otherwise.
         """
-        # Move to the target frame and wait for render
-        self.source.setCurrentTime(frame_number)
-        self.source.waitForDone()
-        
-        # Get pixel data from the layer at full document size
-        pixel_data = layer.projectionPixelData(0, 0, self._width, self._height)
+        if pixel_data is None:
+            # Move to the target frame and wait for render
+            self.source.setCurrentTime(frame_number)
+            self.source.waitForDone()
+            
+            # Get pixel data from the layer at full document size
+            pixel_data = layer.projectionPixelData(0, 0, self._width, self._height)
         
         if not pixel_data:
             return False
         
+        if self.supports_direct_export:
+            return self.export_frame_direct(pixel_data, output_path)
+        
         # Build a temporary document for clean export
         temp_doc = self._create_temp_document()
         if temp_doc is None:
@@ -68,21 +176,36 @@ class FrameExporter:
             self._transfer_pixels(temp_doc, pixel_data)
             
             # Export using Krita's native PNG export
-            export_config = self._build_png_config()
-            success = temp_doc.exportImage(output_path, export_config)
+            success = temp_doc.exportImage(output_path, self._png_config)
             
             return success
             
         finally:
-            # Always clean up the temp document
-            temp_doc.close()
+            # Keep the temp document for the next frame; its pixels are
+            # fully overwritten by _transfer_pixels
+            self._temp_pool.append(temp_doc)
+    
+    def close(self) -> None:
+        """Stop the background writer and close all pooled temporary documents."""
+        if self._writer_thread is not None:
+            self._write_queue.put(None)
+            self._writer_thread.join()
+            self._writer_thread = None
+        
+        while self._temp_pool:
+            self._temp_pool.pop().close()
     
     def _create_temp_document(self):
-        """Create a temporary document matching source document properties.
+        """Get a temporary document matching source document properties.
+        
+        Reuses a pooled document if one is available.
         
         Returns:
-            A new Krita document, or None if creation failed.
+            A Krita document, or None if creation failed.
         """
+        if self._temp_pool:
+            return self._temp_pool.pop()
+        
         return self.krita_instance.createDocument(
             self._width,
             self._height,
@@ -108,9 +231,9 @@ class FrameExporter:
             target_layer = children[0]
             target_layer.setPixelData(pixel_data, 0, 0, self._width, self._height)
         
-        # Ensure the document is fully updated
+        # Push the new pixels into the projection; exportImage locks the
+        # image before saving, which waits for this refresh to finish
         temp_doc.refreshProjection()
-        temp_doc.waitForDone()
     
     def _build_png_config(self) -> 'InfoObject':
         """Build PNG export configuration.
@@ -120,7 +243,7 @@ class FrameExporter:
         """
         config = krita.InfoObject()
         config.setProperty("alpha", True)
-        config.setProperty("compression", 6)
+        config.setProperty("compression", self._compression)
         config.setProperty("indexed", False)
         config.setProperty("interlaced", False)
         return config
@@ -3,8 +3,16 @@
 Functions for working with Krita layers during animation export.
 """
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 # Supported layer types for animation export
-ANIMATED_LAYER_TYPES = ["paintlayer"]
+ANIMATED_LAYER_TYPES = frozenset(("paintlayer",))
+
+# Layer type of group layers
+GROUP_LAYER_TYPE = "grouplayer"
 
 # Reference layer color label (grey = 8)
 REFERENCE_LAYER_COLOR = 8
@@ -14,236 +22,298 @@ LIGHT_TABLE_PREFIX = "LT_"
 LIGHT_TABLE_NAME = "Light Table"
 
 
-def get_animated_layers(
+class LayerRecord:
+    """Attributes of a layer node, read from Krita once per walk.
+    
+    name is None when it wasn't needed to decide whether the layer is
+    excluded.
+    """
+    
+    __slots__ = ('node', 'type', 'name', 'excluded', 'animated', 'children')
+    
+    def __init__(self, node, name, excluded: bool):
+        self.node = node
+        self.type = None  # Read by walk_document for records it keeps
+        self.name = name
+        self.excluded = excluded  # Excluded by the export options, with its children
+        self.animated = False  # For groups: whether any descendant is animated
+        self.children = []  # Child LayerRecords (groups only)
+
+
+def _read_record(node, include_invisible: bool, include_reference: bool) -> LayerRecord:
+    """Read the attributes that decide whether export options exclude a layer.
+    
+    Predicates are checked cheapest first, and attributes are only read
+    from Krita while the layer may still be included.
+    """
+    # Skip invisible layers unless requested
+    if not include_invisible and not node.visible():
+        return LayerRecord(node, None, True)
+    
+    # Skip reference layers unless requested
+    if not include_reference and node.colorLabel() == REFERENCE_LAYER_COLOR:
+        return LayerRecord(node, None, True)
+    
+    # Skip Light Table layers
+    name = node.name()
+    excluded = name.startswith(LIGHT_TABLE_PREFIX) or name == LIGHT_TABLE_NAME
+    return LayerRecord(node, name, excluded)
+
+
+def walk_document(
     document,
     include_invisible: bool = False,
-    include_reference: bool = False,
-    flatten_groups: bool = False
+    include_reference: bool = False
 ) -> list:
-    """Get all exportable animated layers from a document.
+    """Read the document's layer tree in a single pass.
     
-    When flatten_groups is False, recursively finds all animated paint layers.
-    When flatten_groups is True, includes groups that contain animated children
-    (as flattened composites) and does not recurse into them.
+    Each node's attributes are read once, so layer queries can filter the
+    returned records instead of querying Krita again. Excluded top-level
+    layers are left out together with their children. Excluded layers
+    inside groups are kept (marked as excluded) since they still count
+    towards the group's animation state. The tree is walked with an
+    explicit stack, so deeply nested groups can't hit the recursion limit.
     
     Args:
         document: The Krita document.
         include_invisible: Whether to include hidden layers.
         include_reference: Whether to include reference layers (grey color label).
-        flatten_groups: Whether to export groups as flattened images.
         
     Returns:
-        List of animated layer nodes suitable for export.
+        List of LayerRecord for the root's children, with nested children
+        for groups.
     """
-    layers = []
+    return _walk_children(document.rootNode(), include_invisible, include_reference, True)
+
+
+def _walk_children(node, include_invisible: bool, include_reference: bool,
+                   prune_excluded: bool) -> list:
+    """Read the layer tree below node into LayerRecords (see walk_document).
+    
+    With prune_excluded, excluded children of node are left out together
+    with their subtrees.
+    """
+    root_records = []
+    groups = []  # Group records in creation order (parents before children)
+    stack = [(node, root_records)]
     
-    def collect_layers(node):
+    while stack:
+        node, records = stack.pop()
         for child in node.childNodes():
-            # Skip invisible layers unless requested
-            if not include_invisible and not child.visible():
-                continue
-            
-            # Skip reference layers unless requested
-            if not include_reference and is_reference_layer(child):
-                continue
-            
-            # Skip Light Table layers
-            layer_name = child.name()
-            if layer_name.startswith(LIGHT_TABLE_PREFIX) or layer_name == LIGHT_TABLE_NAME:
-                continue
+            record = _read_record(child, include_invisible, include_reference)
+            if prune_excluded and record.excluded and records is root_records:
+                continue  # Nothing depends on this subtree
             
-            layer_type = child.type()
-            
-            if layer_type == 'grouplayer':
-                if flatten_groups:
-                    # Check if this group contains animated content
-                    if group_has_animated_content(child):
-                        layers.append(child)
-                    # Don't recurse into groups we're flattening
-                else:
-                    # Recurse into groups to find individual paint layers
-                    collect_layers(child)
+            layer_type = record.type = child.type()
+            if layer_type == GROUP_LAYER_TYPE:
+                groups.append(record)
+                stack.append((child, record.children))
             elif layer_type in ANIMATED_LAYER_TYPES:
-                if child.animated():
-                    layers.append(child)
+                record.animated = child.animated()
+            records.append(record)
     
-    collect_layers(document.rootNode())
-    # Reverse so Krita's top layer (front) maps to highest OpenToonz column (front)
-    return list(reversed(layers))
+    # Resolve group animation bottom-up: children were created after parents
+    for record in reversed(groups):
+        record.animated = any(c.animated for c in record.children)
+    
+    return root_records
 
 
-def get_static_layers(
+def partition_layers(
     document,
     include_invisible: bool = False,
-    include_reference: bool = False
-) -> list:
-    """Get all exportable non-animated (static) layers from a document.
+    include_reference: bool = False,
+    flatten_groups: bool = False,
+    records: list = None
+) -> tuple:
+    """Split a document's exportable layers into animated and static lists.
+    
+    Both lists are collected in a single walk over the layer tree.
+    
+    Animated layers: when flatten_groups is False, all animated paint layers
+    are found recursively. When flatten_groups is True, groups that contain
+    animated children are included (as flattened composites) and their
+    children are not collected as animated layers.
     
-    Static layers are paint layers without animation keyframes, useful for
-    backgrounds, layouts, peg bars, or safety margins.
+    Static layers are paint layers without animation keyframes, always
+    found recursively, useful for backgrounds, layouts, peg bars, or safety
+    margins.
     
     Args:
         document: The Krita document.
         include_invisible: Whether to include hidden layers.
         include_reference: Whether to include reference layers (grey color label).
+        flatten_groups: Whether to export groups as flattened images.
+        records: Optional result of walk_document with the same include
+            options to reuse.
         
     Returns:
-        List of static paint layer nodes suitable for export.
+        Tuple of (animated LayerRecords, static paint LayerRecords). The
+        records carry the attributes read during the walk, so callers
+        don't need to query the nodes again.
     """
-    layers = []
+    if records is None:
+        records = walk_document(document, include_invisible, include_reference)
+    animated = []
+    static = []
     
-    def collect_layers(node):
-        for child in node.childNodes():
-            # Skip invisible layers unless requested
-            if not include_invisible and not child.visible():
-                continue
-            
-            # Skip reference layers unless requested
-            if not include_reference and is_reference_layer(child):
-                continue
-            
-            # Skip Light Table layers
-            layer_name = child.name()
-            if layer_name.startswith(LIGHT_TABLE_PREFIX) or layer_name == LIGHT_TABLE_NAME:
-                continue
-            
-            layer_type = child.type()
-            
-            if layer_type == 'grouplayer':
-                # Recurse into groups to find static paint layers
-                collect_layers(child)
-            elif layer_type in ANIMATED_LAYER_TYPES:
-                # Only include non-animated paint layers
-                if not child.animated():
-                    layers.append(child)
+    # Depth-first in layer order: children are pushed in reverse so they pop
+    # in order. in_group is set inside groups when groups are flattened, as
+    # their animated descendants are covered by the group itself.
+    stack = [(record, False) for record in reversed(records)]
+    while stack:
+        record, in_group = stack.pop()
+        if record.excluded:
+            continue
+        
+        if record.type == GROUP_LAYER_TYPE:
+            if flatten_groups and not in_group and record.animated:
+                animated.append(record)
+            # Descend into groups to find paint layers
+            child_in_group = in_group or flatten_groups
+            stack.extend((child, child_in_group) for child in reversed(record.children))
+        elif record.type in ANIMATED_LAYER_TYPES:
+            if not record.animated:
+                static.append(record)
+            elif not in_group:
+                animated.append(record)
     
-    collect_layers(document.rootNode())
     # Reverse so Krita's top layer (front) maps to highest OpenToonz column (front)
-    return list(reversed(layers))
+    return animated[::-1], static[::-1]
 
 
-def group_has_animated_content(group) -> bool:
-    """Check if a group layer contains any animated children.
+def get_animated_layers(
+    document,
+    include_invisible: bool = False,
+    include_reference: bool = False,
+    flatten_groups: bool = False,
+    records: list = None
+) -> list:
+    """Get all exportable animated layers from a document.
     
-    Recursively checks all descendants for animation keyframes.
+    See partition_layers for how groups are handled.
     
     Args:
-        group: The group layer node to check.
+        document: The Krita document.
+        include_invisible: Whether to include hidden layers.
+        include_reference: Whether to include reference layers (grey color label).
+        flatten_groups: Whether to export groups as flattened images.
+        records: Optional result of walk_document with the same include
+            options to reuse.
         
     Returns:
-        True if the group contains animated content.
+        List of animated layer nodes suitable for export.
     """
-    for child in group.childNodes():
-        if child.type() in ANIMATED_LAYER_TYPES:
-            if child.animated():
-                return True
-        elif child.type() == 'grouplayer':
-            if group_has_animated_content(child):
-                return True
-    return False
+    animated = partition_layers(
+        document, include_invisible, include_reference, flatten_groups, records
+    )[0]
+    return [record.node for record in animated]
 
 
-def get_group_keyframes(group, start_frame: int, end_frame: int) -> list:
-    """Get all keyframe indices for any animated layer within a group.
+def get_layer_keyframes(layer, start_frame: int, end_frame: int) -> list:
+    """Get all keyframe indices for a layer within a frame range.
     
-    Since groups don't have their own keyframes, we collect keyframes
-    from all animated children and return a unified list.
+    For group layers, collects keyframes from all animated children. The
+    layer is read into a LayerRecord and passed to get_record_keyframes.
     
     Args:
-        group: The group layer.
+        layer: The animated layer or group layer.
         start_frame: First frame to check.
         end_frame: Last frame to check (inclusive).
         
     Returns:
-        Sorted list of unique frame numbers that have keyframes in any child.
+        Sorted list of frame numbers that have keyframes.
     """
-    keyframe_set = set()
-    
-    def collect_keyframes(node):
-        for child in node.childNodes():
-            if child.type() in ANIMATED_LAYER_TYPES and child.animated():
-                for frame in range(start_frame, end_frame + 1):
-                    if child.hasKeyframeAtTime(frame):
-                        keyframe_set.add(frame)
-            elif child.type() == 'grouplayer':
-                collect_keyframes(child)
-    
-    collect_keyframes(group)
-    return sorted(keyframe_set)
+    record = LayerRecord(layer, None, False)
+    record.type = layer.type()
+    if record.type == GROUP_LAYER_TYPE:
+        # Every child counts, whatever the export options exclude
+        record.children = _walk_children(layer, True, True, False)
+    return get_record_keyframes(record, start_frame, end_frame)
 
 
-def is_reference_layer(layer) -> bool:
-    """Check if a layer is marked as a reference layer by its color label.
+def get_record_keyframes(record: LayerRecord, start_frame: int, end_frame: int) -> list:
+    """Get all keyframe indices for a layer record within a frame range.
     
-    Reference layers use the grey color label (index 8) to indicate they
-    are animation guides that should typically be excluded from export.
+    A group's animated children are taken from its child records, so only
+    the keyframe queries go to Krita.
     
     Args:
-        layer: The Krita layer node.
+        record: LayerRecord of an animated layer or group layer.
+        start_frame: First frame to check.
+        end_frame: Last frame to check (inclusive).
         
     Returns:
-        True if the layer has the reference layer color label.
+        Sorted list of frame numbers that have keyframes.
     """
-    return layer.colorLabel() == REFERENCE_LAYER_COLOR
+    frames = range(start_frame, end_frame + 1)
+    if record.type != GROUP_LAYER_TYPE:
+        layer = record.node
+        return [frame for frame in frames if layer.hasKeyframeAtTime(frame)]
+    
+    keyframe_set = set()
+    stack = [record]
+    while stack:
+        for child in stack.pop().children:
+            if child.type == GROUP_LAYER_TYPE:
+                stack.append(child)
+            elif child.animated:
+                layer = child.node
+                for frame in frames:
+                    # Frames already keyed by another child need no query
+                    if frame not in keyframe_set and layer.hasKeyframeAtTime(frame):
+                        keyframe_set.add(frame)
+    return sorted(keyframe_set)
 
 
-def get_layer_keyframes(layer, start_frame: int, end_frame: int) -> list:
-    """Get all keyframe indices for a layer within a frame range.
+def get_all_layer_keyframes(records: list, start_frame: int, end_frame: int) -> list:
+    """Get keyframe indices for several layers in one scan.
     
-    For group layers, collects keyframes from all animated children.
+    Layers are queried one after another: Krita's node API must only be
+    used from the GUI thread, so the queries cannot be spread over threads.
     
     Args:
-        layer: The animated layer or group layer.
+        records: LayerRecords of animated layers or group layers.
         start_frame: First frame to check.
         end_frame: Last frame to check (inclusive).
         
     Returns:
-        List of frame numbers that have keyframes.
+        List of keyframe lists, in the same order as records.
     """
-    # For groups, delegate to the specialized function
-    if layer.type() == 'grouplayer':
-        return get_group_keyframes(layer, start_frame, end_frame)
-    
-    keyframes = []
-    for frame in range(start_frame, end_frame + 1):
-        if layer.hasKeyframeAtTime(frame):
-            keyframes.append(frame)
-    return keyframes
+    return [get_record_keyframes(record, start_frame, end_frame) for record in records]
 
 
-def count_total_keyframes(layers: list, start_frame: int, end_frame: int) -> int:
-    """Count total keyframes across all layers for progress reporting.
+def is_stop_frame(layer) -> bool:
+    """Check if the current frame is a stop frame (empty layer bounds).
+    
+    Stop frames are blank keyframes used to end a hold in traditional animation.
+    This only queries the bounds, so it can run before any pixels are read.
     
     Args:
-        layers: List of animated layers.
-        start_frame: First frame to check.
-        end_frame: Last frame to check (inclusive).
+        layer: The layer to check at its current time.
         
     Returns:
-        Total number of keyframes across all layers.
+        True if the frame has no content (stop frame).
     """
-    total = 0
-    for layer in layers:
-        total += len(get_layer_keyframes(layer, start_frame, end_frame))
-    return total
+    return layer.bounds().isEmpty()
 
 
-def is_stop_frame(layer) -> bool:
-    """Check if the current frame is a stop frame (fully transparent).
+def is_transparent(pixel_data) -> bool:
+    """Check if 8-bit RGBA pixel data is fully transparent.
     
-    Stop frames are blank keyframes used to end a hold in traditional animation.
+    Catches keyframes that were erased to full transparency, whose bounds
+    are not empty. Uses NumPy when installed; the fallback copies the alpha
+    bytes with a strided memoryview, which also runs in C.
     
     Args:
-        layer: The layer to check at its current time.
+        pixel_data: Pixel data of an RGBA/U8 layer (BGRA byte order).
         
     Returns:
-        True if the frame is fully transparent (stop frame).
+        True if every pixel has zero alpha.
     """
-    # Get a small sample of pixel data to check for content
-    # We check the entire layer bounds
-    bounds = layer.bounds()
-    if bounds.isEmpty():
-        return True
-    
-    # If bounds are empty, it's a stop frame
-    return bounds.width() == 0 or bounds.height() == 0
+    # Alpha is every 4th byte (BGRA layout)
+    if np is None:
+        alpha = bytes(memoryview(pixel_data).cast('B')[3::4])
+        return not alpha.strip(b"\0")
+    alpha = np.frombuffer(pixel_data, dtype=np.uint8)[3::4]
+    return not alpha.any()
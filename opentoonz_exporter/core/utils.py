@@ -6,6 +6,23 @@ General-purpose helper functions used throughout the exporter.
 import os
 import re
 import hashlib
+from functools import partial
+
+try:
+    import sqlite3
+except ImportError:  # Some Python builds ship without sqlite3
+    sqlite3 = None
+
+# Hasher for content deduplication: BLAKE3 if installed, else BLAKE2b.
+# Collision resistance only matters for equality checks, so either is fine.
+try:
+    from blake3 import blake3 as _new_hasher
+except ImportError:
+    _new_hasher = partial(hashlib.blake2b, digest_size=16)
+
+# Characters that are problematic in filenames across operating systems
+_SANITIZE_RE = re.compile(r'[<>:"/\\|?*]')
+_SPACE_TRANS = str.maketrans({" ": "_"})
 
 
 def mkdir(directory: str) -> None:
@@ -17,12 +34,7 @@ def mkdir(directory: str) -> None:
     Raises:
         OSError: If directory creation fails for reasons other than existence.
     """
-    if os.path.exists(directory):
-        return
-    try:
-        os.makedirs(directory)
-    except OSError as e:
-        raise e
+    os.makedirs(directory, exist_ok=True)
 
 
 def int_to_str(value: int, num_digits: int = 4) -> str:
@@ -35,7 +47,7 @@ def int_to_str(value: int, num_digits: int = 4) -> str:
     Returns:
         Zero-padded string representation.
     """
-    return str(value).zfill(num_digits)
+    return f"{value:0{num_digits}d}"
 
 
 def sanitize_filename(name: str) -> str:
@@ -50,16 +62,14 @@ def sanitize_filename(name: str) -> str:
     Returns:
         A filesystem-safe version of the name.
     """
-    # Replace spaces with underscores
-    sanitized = name.replace(" ", "_")
-    # Remove characters that are problematic in filenames
-    sanitized = re.sub(r'[<>:"/\\|?*]', '', sanitized)
+    # Replace spaces with underscores, then remove problematic characters
+    sanitized = _SANITIZE_RE.sub("", name.translate(_SPACE_TRANS))
     # Strip leading/trailing whitespace and dots
     sanitized = sanitized.strip('. ')
     return sanitized if sanitized else "unnamed"
 
 
-def make_unique_name(name: str, used_names: set) -> str:
+def make_unique_name(name: str, used_names: set, counters: dict = None) -> str:
     """Generate a unique name by appending a numeric suffix if necessary.
     
     If the name is already in used_names, appends _1, _2, etc. until unique.
@@ -68,6 +78,9 @@ def make_unique_name(name: str, used_names: set) -> str:
     Args:
         name: The desired name.
         used_names: Set of already-used names.
+        counters: Optional dict remembering the last suffix used per name,
+            so repeated collisions continue from there instead of probing
+            from _1 again. Pass the same dict along with used_names.
         
     Returns:
         A unique version of the name.
@@ -76,25 +89,206 @@ def make_unique_name(name: str, used_names: set) -> str:
         used_names.add(name)
         return name
     
-    counter = 1
+    counter = counters.get(name, 0) + 1 if counters is not None else 1
     while f"{name}_{counter}" in used_names:
         counter += 1
     
+    if counters is not None:
+        counters[name] = counter
     unique_name = f"{name}_{counter}"
     used_names.add(unique_name)
     return unique_name
 
 
-def compute_content_hash(pixel_data: bytes) -> str:
+class NameRegistry:
+    """Hands out unique names within one export.
+    
+    Keeps the set of used names together with the last suffix used per
+    name, so a name that collides repeatedly gets its next suffix without
+    probing _1, _2, etc. again.
+    """
+    
+    def __init__(self):
+        self.used_names = set()
+        self._counters = {}
+    
+    def make_unique(self, name: str) -> str:
+        """Get a unique version of name and mark it as used.
+        
+        Args:
+            name: The desired name.
+            
+        Returns:
+            name, or name with a numeric suffix if it was already used.
+        """
+        return make_unique_name(name, self.used_names, self._counters)
+
+
+# Bytes fed to the hasher per update in compute_content_hash
+HASH_CHUNK_SIZE = 1 << 20
+
+
+def compute_content_hash(pixel_data) -> str:
     """Compute a hash of pixel data for content deduplication.
     
     Used to detect clone keyframes (exposures) that share the same content,
     allowing us to export only one copy and reference it multiple times.
+    Uses BLAKE3 when the ``blake3`` package is installed and falls back
+    to BLAKE2b from the standard library otherwise.
+    
+    The buffer is hashed in place through a memoryview, in chunks so that
+    export worker threads get a chance to run between updates.
     
     Args:
-        pixel_data: Raw pixel data from a layer.
+        pixel_data: Raw pixel data from a layer (bytes, QByteArray or any
+            other buffer object).
         
     Returns:
         Hexadecimal hash string.
     """
-    return hashlib.md5(pixel_data).hexdigest()
+    view = memoryview(pixel_data).cast('B')
+    hasher = _new_hasher()
+    for offset in range(0, len(view), HASH_CHUNK_SIZE):
+        hasher.update(view[offset:offset + HASH_CHUNK_SIZE])
+    return hasher.hexdigest()
+
+
+class FrameDeduplicator:
+    """Maps frame content to previously exported frame IDs.
+    
+    Each frame is fully hashed once, when it is looked up. The hash is kept
+    with the frame ID, so registering the frame or writing the hash cache
+    never needs its pixel data again.
+    """
+    
+    def __init__(self):
+        """Initialize the deduplicator."""
+        self._frame_ids = {}  # content hash -> frame_id
+        self._hashes = {}  # frame_id -> content hash
+    
+    def find(self, pixel_data) -> tuple:
+        """Look up a frame with the same content.
+        
+        Args:
+            pixel_data: Raw pixel data of the frame.
+            
+        Returns:
+            Tuple (frame_id, content_hash). frame_id is None if the content
+            is new; content_hash must then be passed to add() when the frame
+            is exported.
+        """
+        content_hash = compute_content_hash(pixel_data)
+        return self._frame_ids.get(content_hash), content_hash
+    
+    def add(self, content_hash: str, frame_id: int) -> None:
+        """Register newly exported content.
+        
+        Args:
+            content_hash: The hash returned by find() for this content, or
+                one read from the hash cache.
+            frame_id: The frame ID the content was exported as.
+        """
+        self._frame_ids.setdefault(content_hash, frame_id)
+        self._hashes[frame_id] = content_hash
+    
+    def get_hash(self, frame_id: int) -> str:
+        """Get the content hash of a registered frame.
+        
+        Args:
+            frame_id: The frame ID passed to add().
+            
+        Returns:
+            Hexadecimal hash string.
+        """
+        return self._hashes[frame_id]
+
+
+# File in the scene folder remembering the frames of the last export.
+# OpenToonz ignores it; deleting it only makes the next export a full one.
+HASH_CACHE_FILENAME = "_export_cache.sqlite"
+
+
+def load_hash_cache(export_dir: str, stamp: tuple, compression: int) -> dict:
+    """Load the frames recorded by a previous export of the same document.
+    
+    Args:
+        export_dir: Directory containing the cache file.
+        stamp: (mtime_ns, size) of the document file. Frames recorded for
+            another version of the document are ignored.
+        compression: PNG compression level of this export. Frames written
+            with another level are ignored.
+        
+    Returns:
+        Dict mapping (layer_uuid, frame) to (content_hash, path), where
+        path is the PNG the frame was exported as. Both are None for stop
+        frames.
+    """
+    cache_path = os.path.join(export_dir, HASH_CACHE_FILENAME)
+    if sqlite3 is None or not os.path.isfile(cache_path):
+        return {}
+    
+    try:
+        connection = sqlite3.connect(cache_path)
+        try:
+            rows = connection.execute(
+                "SELECT layer_uuid, frame, hash, path FROM frames "
+                "WHERE mtime_ns = ? AND size = ? AND compression = ?",
+                (*stamp, compression)
+            ).fetchall()
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return {}  # A damaged cache only costs a full export
+    
+    return {
+        (layer_uuid, frame): (content_hash, path)
+        for layer_uuid, frame, content_hash, path in rows
+    }
+
+
+def save_hash_cache(export_dir: str, stamp: tuple, compression: int, rows) -> None:
+    """Replace the cached frames with those of the latest export.
+    
+    Args:
+        export_dir: Directory to store the cache file in.
+        stamp: (mtime_ns, size) of the exported document file.
+        compression: PNG compression level the frames were written with.
+        rows: Iterable of (layer_uuid, frame, content_hash, path) tuples, as
+            returned by load_hash_cache.
+    """
+    if sqlite3 is None:
+        return
+    
+    cache_path = os.path.join(export_dir, HASH_CACHE_FILENAME)
+    try:
+        connection = sqlite3.connect(cache_path)
+        try:
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS frames ("
+                    "layer_uuid TEXT, frame INT, mtime_ns INT, size INT, "
+                    "compression INT, hash TEXT, path TEXT, "
+                    "PRIMARY KEY(layer_uuid, frame))"
+                )
+                connection.execute("DELETE FROM frames")
+                connection.executemany(
+                    "INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ((layer_uuid, frame, *stamp, compression, content_hash, path)
+                     for layer_uuid, frame, content_hash, path in rows)
+                )
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        pass  # The cache is only an optimization
+
+
+def clear_hash_cache(export_dir: str) -> None:
+    """Delete the hash cache, e.g. while an export is in progress.
+    
+    Args:
+        export_dir: Directory containing the cache file.
+    """
+    try:
+        os.remove(os.path.join(export_dir, HASH_CACHE_FILENAME))
+    except OSError:
+        pass  # No cache to delete
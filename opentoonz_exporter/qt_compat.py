@@ -9,10 +9,11 @@ try:
         QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
         QLabel, QPushButton, QProgressDialog, QMessageBox,
         QFileDialog, QCheckBox, QSpinBox, QLineEdit, QGroupBox,
-        QApplication, QDialog, QDialogButtonBox, QComboBox
+        QApplication, QDialog, QDialogButtonBox, QComboBox, QTabWidget
     )
     from PyQt6.QtCore import Qt, QRect, QUrl, QSettings, QStandardPaths
     from PyQt6.QtGui import QIcon, QDesktopServices
+    from PyQt6 import sip
     
     PYQT_VERSION = 6
 
@@ -21,14 +22,18 @@ except ImportError:
         QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
         QLabel, QPushButton, QProgressDialog, QMessageBox,
         QFileDialog, QCheckBox, QSpinBox, QLineEdit, QGroupBox,
-        QApplication, QDialog, QDialogButtonBox, QComboBox
+        QApplication, QDialog, QDialogButtonBox, QComboBox, QTabWidget
     )
     from PyQt5.QtCore import Qt, QRect, QUrl, QSettings, QStandardPaths
     from PyQt5.QtGui import QIcon, QDesktopServices
+    from PyQt5 import sip
     
     PYQT_VERSION = 5
 
+# Scoped enum access works on both PyQt5 and PyQt6
+WINDOW_MODAL = Qt.WindowModality.WindowModal
+
 
 def get_window_modality():
     """Get the correct WindowModal enum value for the current Qt version."""
-    return Qt.WindowModality.WindowModal
+    return WINDOW_MODAL
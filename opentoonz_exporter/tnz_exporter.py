@@ -5,11 +5,51 @@ frames, generating ToonzScript, and executing it via OpenToonz command line.
 """
 
 import os
+import queue
 import subprocess
+import threading
+import time
 
 from .toonz_script import generate_blank_scene_script, generate_scene_with_levels_script
 from .core.exporter import OpenToonzExportEngine, ExportOptions, ExportResult
 
+# Maximum time OpenToonz may take to run a script, in seconds
+SCRIPT_TIMEOUT = 120
+
+# Printed by the generated scripts once the scene has been saved
+SCRIPT_SUCCESS_MESSAGE = "Scene created successfully!"
+
+# Time OpenToonz gets to exit on its own before it is killed, in seconds
+SCRIPT_EXIT_TIMEOUT = 10
+
+
+def _read_lines(stream, lines: queue.Queue) -> None:
+    """Forward lines from a process output stream to a queue.
+    
+    Closes the stream once the output ends.
+    """
+    try:
+        for line in stream:
+            lines.put(line)
+    finally:
+        stream.close()
+
+
+def _finish_process(process: subprocess.Popen, reader: threading.Thread) -> None:
+    """Kill OpenToonz if it is still running, reap it and close its output pipe.
+    
+    The reader thread closes the pipe when the output ends; if a child
+    process of OpenToonz still holds the pipe open, the daemon reader
+    closes it once that process exits.
+    """
+    if process.poll() is None:
+        process.kill()
+    process.wait()
+    
+    reader.join(timeout=1)
+    if not reader.is_alive():
+        process.stdout.close()  # No-op if the reader already closed it
+
 
 class TNZExporter:
     """Exports Krita documents to OpenToonz scene format.
@@ -136,7 +176,9 @@ class TNZExporter:
         script_content = generate_scene_with_levels_script(output_tnz_path, layer_infos)
         
         # Write and run the script
-        script_result = self._write_and_run_script(script_content, output_tnz_path)
+        script_result = self._write_and_run_script(
+            script_content, output_tnz_path, on_progress, on_cancelled
+        )
         
         if script_result['success']:
             script_result['layer_count'] = result.layer_count
@@ -144,12 +186,15 @@ class TNZExporter:
         
         return script_result
     
-    def _write_and_run_script(self, script_content: str, output_tnz_path: str) -> dict:
+    def _write_and_run_script(self, script_content: str, output_tnz_path: str,
+                              on_progress=None, on_cancelled=None) -> dict:
         """Write a ToonzScript to disk and execute it.
         
         Args:
             script_content: The ToonzScript code.
             output_tnz_path: Path to the expected .tnz output (for verification).
+            on_progress: Optional callback (current, total, message).
+            on_cancelled: Optional callback that returns True if cancelled.
             
         Returns:
             Dict with 'success' bool and 'message' str.
@@ -160,75 +205,159 @@ class TNZExporter:
         script_path = os.path.join(output_dir, script_filename)
         
         try:
-            # Write the script file
-            with open(script_path, 'w', encoding='utf-8') as f:
-                f.write(script_content)
+            # Write the script file in one go as UTF-8 bytes
+            with open(script_path, 'wb') as f:
+                f.write(script_content.encode('utf-8'))
             
             # Run OpenToonz with the script
-            result = self._run_opentoonz_script(script_path, output_tnz_path)
+            result = self._run_opentoonz_script(
+                script_path, output_tnz_path, on_progress, on_cancelled
+            )
             
             return result
             
         finally:
             # Clean up the temporary script file
-            if os.path.exists(script_path):
-                try:
-                    os.remove(script_path)
-                except:
-                    pass  # Ignore cleanup errors
+            try:
+                os.remove(script_path)
+            except OSError:
+                pass  # Ignore cleanup errors (including a missing file)
     
-    def _run_opentoonz_script(self, script_path: str, output_tnz_path: str = "") -> dict:
+    def _run_opentoonz_script(self, script_path: str, output_tnz_path: str = "",
+                              on_progress=None, on_cancelled=None) -> dict:
         """Run a ToonzScript file through OpenToonz.
         
+        Output is streamed while OpenToonz runs, so progress callbacks keep
+        the UI responsive and cancellation stops the process. Once the script
+        reports success or the export is cancelled, OpenToonz gets
+        SCRIPT_EXIT_TIMEOUT to exit while progress keeps being reported, and
+        is killed after that. The process is always reaped before returning,
+        so the script file can be deleted.
+        
         Args:
             script_path: Path to the .toonzscript file.
             output_tnz_path: Path to the expected output file (for verification).
+            on_progress: Optional callback (current, total, message).
+            on_cancelled: Optional callback that returns True if cancelled.
             
         Returns:
-            Dict with 'success' bool and 'message' str.
+            Dict with 'success' bool and 'message' str. Once OpenToonz has
+            run, 'stdout' holds its output with stderr merged in and 'killed'
+            is True if OpenToonz had to be killed after finishing the script
+            or being cancelled.
         """
         try:
             # Build the command
             cmd = [self._opentoonz_path, script_path]
             
-            # Run the command with timeout
-            result = subprocess.run(
+            # Start OpenToonz with stderr merged into stdout
+            process = subprocess.Popen(
                 cmd,
-                capture_output=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
                 text=True,
-                timeout=120,  # 2 minute timeout for larger exports
+                errors='replace',
                 creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
             )
             
-            # Combine stdout and stderr for checking
-            all_output = (result.stdout or "") + (result.stderr or "")
+            # Read output on a helper thread so this loop never blocks on it
+            lines = queue.Queue()
+            reader = threading.Thread(
+                target=_read_lines, args=(process.stdout, lines), daemon=True
+            )
+            reader.start()
+            
+            output_lines = []
+            status = "Creating OpenToonz scene..."
+            cancelled = False
+            timed_out = False
+            killed = False
+            deadline = time.monotonic() + SCRIPT_TIMEOUT
+            exit_deadline = None  # Set once OpenToonz is expected to exit
+            
+            try:
+                while process.poll() is None:
+                    try:
+                        line = lines.get(timeout=0.1)
+                    except queue.Empty:
+                        line = ""
+                    
+                    if line:
+                        output_lines.append(line)
+                        if SCRIPT_SUCCESS_MESSAGE in line and exit_deadline is None:
+                            # The scene is saved before the message is printed
+                            exit_deadline = time.monotonic() + SCRIPT_EXIT_TIMEOUT
+                            status = "Closing OpenToonz..."
+                    
+                    if on_progress:
+                        on_progress(0, 0, status)
+                    
+                    if exit_deadline is None:
+                        if on_cancelled and on_cancelled():
+                            cancelled = True
+                            process.terminate()
+                            exit_deadline = time.monotonic() + SCRIPT_EXIT_TIMEOUT
+                            status = "Stopping OpenToonz..."
+                        elif time.monotonic() > deadline:
+                            timed_out = True
+                            break
+                    elif time.monotonic() > exit_deadline:
+                        killed = True
+                        break
+                    elif not cancelled and on_cancelled and on_cancelled():
+                        # The scene is already saved; stop waiting for OpenToonz
+                        cancelled = killed = True
+                        break
+            finally:
+                # Reap OpenToonz on every exit path
+                _finish_process(process, reader)
+            
+            # Collect output printed just before OpenToonz exited
+            while not lines.empty():
+                output_lines.append(lines.get())
+            all_output = "".join(output_lines)
+            
+            if cancelled:
+                return {
+                    'success': False,
+                    'message': 'Export cancelled by user',
+                    'stdout': all_output,
+                    'killed': killed
+                }
+            
+            if timed_out:
+                return {
+                    'success': False,
+                    'message': f'OpenToonz script execution timed out ({SCRIPT_TIMEOUT} seconds).',
+                    'stdout': all_output,
+                    'killed': False
+                }
             
             # OpenToonz quirk: it may return exit code 1 even on success
             # Check for our success message or verify the output file was created
-            script_succeeded = "Scene created successfully!" in all_output
+            script_succeeded = SCRIPT_SUCCESS_MESSAGE in all_output
             file_created = output_tnz_path and os.path.exists(output_tnz_path)
             
             if script_succeeded or file_created:
+                message = 'Scene created successfully!'
+                if killed:
+                    message += (f'\nOpenToonz did not exit within {SCRIPT_EXIT_TIMEOUT} '
+                                'seconds and was closed.')
                 return {
                     'success': True,
-                    'message': 'Scene created successfully!',
-                    'stdout': result.stdout,
-                    'stderr': result.stderr
+                    'message': message,
+                    'stdout': all_output,
+                    'killed': killed
                 }
             else:
                 error_msg = all_output or "Unknown error - no output from OpenToonz"
                 return {
                     'success': False,
                     'message': f'OpenToonz script execution failed:\n{error_msg}',
-                    'stdout': result.stdout,
-                    'stderr': result.stderr
+                    'stdout': all_output,
+                    'killed': killed
                 }
                 
-        except subprocess.TimeoutExpired:
-            return {
-                'success': False,
-                'message': 'OpenToonz script execution timed out (120 seconds).'
-            }
         except FileNotFoundError:
             return {
                 'success': False,
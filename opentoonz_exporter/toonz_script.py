@@ -187,9 +187,10 @@ def generate_scene_with_levels_script(
         gen.add_blank_line()
         gen.add_comment(f"Set xsheet timing for {layer_info.name} (column {col_index})")
         
-        # Set each cell in the xsheet
-        for xsheet_row, frame_id in layer_info.frame_data:
-            gen.set_cell("scene", xsheet_row, col_index, level_var, frame_id)
+        # Set each cell in the xsheet, expanding held runs
+        for start_row, end_row, frame_id in layer_info.runs():
+            for xsheet_row in range(start_row, end_row + 1):
+                gen.set_cell("scene", xsheet_row, col_index, level_var, frame_id)
         
         gen.add_blank_line()
     
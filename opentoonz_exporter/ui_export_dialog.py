@@ -4,15 +4,20 @@ Modal dialog for exporting to OpenToonz scene format.
 """
 
 import os
+import re
 import sys
+import time
+from functools import lru_cache
+
 import krita
 
 from .qt_compat import (
     QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
     QLabel, QPushButton, QProgressDialog, QMessageBox,
     QFileDialog, QCheckBox, QSpinBox, QGroupBox, QLineEdit,
-    QApplication, get_window_modality, QUrl, QDesktopServices,
-    QDialog, QDialogButtonBox, QComboBox, QSettings, QStandardPaths
+    QApplication, WINDOW_MODAL, QUrl, QDesktopServices,
+    QDialog, QDialogButtonBox, QComboBox, QSettings, QStandardPaths, QTabWidget,
+    sip
 )
 from .config import (
     VERSION, PLUGIN_NAME, PLUGIN_ID,
@@ -21,14 +26,44 @@ from .config import (
     SETTINGS_FLATTEN_GROUPS, SETTINGS_INCLUDE_INVISIBLE,
     SETTINGS_INCLUDE_REFERENCE, SETTINGS_INCLUDE_STATIC
 )
-from .tnz_exporter import TNZExporter
-from .core.exporter import ExportOptions
 
+# Characters not allowed in scene names, and a pattern matching any of them
+_INVALID_FILENAME_CHARS = '<>:"/\\|?*'
+_INVALID_FILENAME_RE = re.compile(f"[{re.escape(_INVALID_FILENAME_CHARS)}]")
+
+# OS-specific placeholder, info text and browse directory for the OpenToonz path
+if sys.platform == "win32":
+    _PLACEHOLDER = "C:\\Program Files\\OpenToonz\\OpenToonz.exe"
+    _OS_INFO = "Detected OS: Windows. Looking for OpenToonz.exe"
+    _DEFAULT_BROWSE_DIR = "C:\\Program Files"
+elif sys.platform == "darwin":
+    _PLACEHOLDER = "/Applications/OpenToonz.app/Contents/MacOS/OpenToonz"
+    _OS_INFO = "Detected OS: macOS. Looking for OpenToonz.app"
+    _DEFAULT_BROWSE_DIR = "/Applications"
+else:
+    _PLACEHOLDER = "/usr/bin/opentoonz"
+    _OS_INFO = f"Detected OS: {sys.platform}. Looking for opentoonz binary"
+    _DEFAULT_BROWSE_DIR = "/usr"
+
+# String values QSettings may return for a stored True (e.g. from INI files)
+_TRUTHY = frozenset(("1", "true", "yes", "on"))
+
+# Settings keys holding export option checkbox states
+_BOOL_SETTINGS = (
+    SETTINGS_FLATTEN_GROUPS, SETTINGS_INCLUDE_INVISIBLE,
+    SETTINGS_INCLUDE_REFERENCE, SETTINGS_INCLUDE_STATIC
+)
 
+# Longest time the progress callback goes without processing UI events (seconds)
+_PROGRESS_PUMP_INTERVAL = 0.05
+
+
+@lru_cache(maxsize=1)
 def get_default_export_path() -> str:
     """Get the default export path based on the operating system.
     
-    Returns the user's Documents folder on all platforms.
+    Returns the user's Documents folder on all platforms. The result is
+    cached for the session.
     
     Returns:
         Path to the default export directory.
@@ -44,25 +79,130 @@ def get_default_export_path() -> str:
     return os.path.expanduser("~")
 
 
+@lru_cache(maxsize=1)
 def find_opentoonz_executable() -> str:
     """Try to find OpenToonz executable in default locations.
     
+    The result is cached for the session; call
+    find_opentoonz_executable.cache_clear() to search again.
+    
     Returns:
         Path to OpenToonz executable if found, empty string otherwise.
     """
     for path in get_opentoonz_default_paths():
-        expanded_path = os.path.expanduser(path)
-        if os.path.isfile(expanded_path):
-            return expanded_path
+        if path.startswith("~"):
+            path = os.path.expanduser(path)
+        if os.path.isfile(path):
+            return path
     return ""
 
 
+def _to_bool(val) -> bool:
+    """Convert a stored setting value to a bool, handling string variants."""
+    if isinstance(val, str):
+        return val.lower() in _TRUTHY
+    return bool(val)
+
+
+def _read_bool_setting(settings, key: str, default: bool) -> bool:
+    """Read a boolean setting, handling string and boolean variants.
+    
+    Args:
+        settings: The dialog's _SettingsCache.
+        key: Settings key.
+        default: Value to use if the key isn't stored.
+        
+    Returns:
+        The stored value as a bool.
+    """
+    return _to_bool(settings.get(key, default))
+
+
+def _qt_address(obj):
+    """Get the address of the Qt object wrapped by obj, or None for None."""
+    return None if obj is None else sip.unwrapinstance(obj)
+
+
+class _SettingsCache:
+    """In-memory copy of the plugin's QSettings.
+    
+    All stored keys are read in one sweep, so the dialog doesn't go back to
+    the registry or settings file for each value. Changed values are only
+    written back, with a single sync, when flush() is called.
+    
+    Values of bool_keys are converted to bools when read, so INI strings
+    such as "true" compare equal to the checkbox states set later.
+    """
+    
+    def __init__(self, settings: QSettings, bool_keys=()):
+        self._settings = settings
+        settings.sync()
+        self._values = {key: settings.value(key) for key in settings.allKeys()}
+        for key in bool_keys:
+            if key in self._values:
+                self._values[key] = _to_bool(self._values[key])
+        self._dirty = set()
+    
+    def get(self, key: str, default=None):
+        """Get a cached setting value, or default if it isn't stored."""
+        return self._values.get(key, default)
+    
+    def set(self, key: str, value) -> None:
+        """Update a setting; it is only marked for writing if it changed."""
+        if key in self._values and self._values[key] == value:
+            return
+        self._values[key] = value
+        self._dirty.add(key)
+    
+    def flush(self) -> None:
+        """Write changed settings and sync them to storage once."""
+        if not self._dirty:
+            return
+        for key in self._dirty:
+            self._settings.setValue(key, self._values[key])
+        self._settings.sync()
+        self._dirty.clear()
+
+
 class OpenToonzExportDialog(QDialog):
     """Modal dialog for exporting to OpenToonz scene format.
     
     Provides options for specifying the OpenToonz path and output location.
+    Use get_or_create() to reuse one dialog across menu invocations.
     """
     
+    # Dialog shared across menu invocations (see get_or_create)
+    _instance = None
+    
+    @classmethod
+    def get_or_create(cls, parent=None):
+        """Get the shared export dialog, creating it on first use.
+        
+        A reused dialog skips building its widgets again and is refreshed
+        for the active document instead. A new dialog is created if the
+        parent window changed or Qt has deleted the previous one.
+        
+        Args:
+            parent: The parent window.
+            
+        Returns:
+            The OpenToonzExportDialog to show.
+        """
+        dialog = cls._instance
+        # Compare the underlying Qt objects: Python wrappers of the same
+        # window aren't guaranteed to be identical
+        reusable = (
+            dialog is not None
+            and not sip.isdeleted(dialog)
+            and _qt_address(dialog.parent()) == _qt_address(parent)
+        )
+        
+        if reusable:
+            dialog._refresh_for_new_document()
+        else:
+            dialog = cls._instance = cls(parent)
+        return dialog
+    
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle(f"Export Animation to OpenToonz Scene - v{VERSION}")
@@ -70,13 +210,14 @@ class OpenToonzExportDialog(QDialog):
         
         self._document = krita.Krita.instance().activeDocument()
         self._settings = QSettings("krita", PLUGIN_ID)
+        self._cache = _SettingsCache(self._settings, _BOOL_SETTINGS)
         
         # Load saved paths or use defaults
-        self._opentoonz_path = self._settings.value(
+        self._opentoonz_path = self._cache.get(
             SETTINGS_OPENTOONZ_PATH, 
             find_opentoonz_executable()
         )
-        self._export_path = self._settings.value(
+        self._export_path = self._cache.get(
             SETTINGS_EXPORT_PATH, 
             get_default_export_path()
         )
@@ -85,6 +226,20 @@ class OpenToonzExportDialog(QDialog):
         self._connect_signals()
         self._load_initial_paths()
     
+    def _refresh_for_new_document(self):
+        """Reset the dialog for the active document before it is shown again.
+        
+        Reloads the saved paths and options, like a newly created dialog,
+        and sets the scene name from the active document.
+        """
+        self._document = krita.Krita.instance().activeDocument()
+        self._opentoonz_path = self._cache.get(SETTINGS_OPENTOONZ_PATH, self._opentoonz_path)
+        self._export_path = self._cache.get(SETTINGS_EXPORT_PATH, self._export_path)
+        
+        if self._settings_tab_built:
+            self._opentoonz_path_edit.setText(self._opentoonz_path or "")
+        self._load_initial_paths()
+    
     def _setup_ui(self):
         """Initialize the user interface."""
         layout = QVBoxLayout(self)
@@ -101,7 +256,6 @@ class OpenToonzExportDialog(QDialog):
         layout.addWidget(header_label)
 
         # Tabs for Export and Settings
-        from PyQt5.QtWidgets import QTabWidget, QWidget
         tab_widget = QTabWidget()
 
         # --- Export Tab ---
@@ -192,8 +346,39 @@ class OpenToonzExportDialog(QDialog):
         tab_widget.addTab(export_tab, "Export")
 
         # --- Settings Tab ---
-        settings_tab = QWidget()
-        settings_layout = QVBoxLayout(settings_tab)
+        # Left empty until first shown; see _ensure_settings_tab
+        self._settings_tab = QWidget()
+        self._settings_tab_built = False
+        tab_widget.addTab(self._settings_tab, "Settings")
+        tab_widget.currentChanged.connect(self._ensure_settings_tab)
+        self._tab_widget = tab_widget
+
+        layout.addWidget(tab_widget)
+
+        # === Dialog Buttons ===
+        button_box = QDialogButtonBox(
+            QDialogButtonBox.StandardButton.Ok |
+            QDialogButtonBox.StandardButton.Cancel
+        )
+        self._ok_button = button_box.button(QDialogButtonBox.StandardButton.Ok)
+        self._ok_button.setText("Export")
+
+        button_box.accepted.connect(self._on_export)
+        button_box.rejected.connect(self.reject)
+
+        layout.addWidget(button_box)
+    
+    def _ensure_settings_tab(self, index: int):
+        """Build the Settings tab the first time it is selected.
+        
+        Args:
+            index: Index of the newly selected tab.
+        """
+        if self._settings_tab_built or self._tab_widget.widget(index) is not self._settings_tab:
+            return
+        self._settings_tab_built = True
+
+        settings_layout = QVBoxLayout(self._settings_tab)
         settings_layout.setContentsMargins(12, 12, 12, 12)
         settings_layout.setSpacing(10)
 
@@ -227,51 +412,36 @@ class OpenToonzExportDialog(QDialog):
         toonz_group.setLayout(toonz_layout)
         settings_layout.addWidget(toonz_group)
         settings_layout.addStretch()
-        tab_widget.addTab(settings_tab, "Settings")
 
-        layout.addWidget(tab_widget)
-
-        # === Dialog Buttons ===
-        button_box = QDialogButtonBox(
-            QDialogButtonBox.StandardButton.Ok |
-            QDialogButtonBox.StandardButton.Cancel
-        )
-        self._ok_button = button_box.button(QDialogButtonBox.StandardButton.Ok)
-        self._ok_button.setText("Export")
-
-        button_box.accepted.connect(self._on_export)
-        button_box.rejected.connect(self.reject)
-
-        layout.addWidget(button_box)
+        self._browse_toonz_button.clicked.connect(self._browse_opentoonz)
+        if self._opentoonz_path:
+            self._opentoonz_path_edit.setText(self._opentoonz_path)
+    
+    def _get_opentoonz_path(self) -> str:
+        """Get the OpenToonz path entered in the Settings tab.
+        
+        Returns:
+            The path from the Settings tab, or the saved path if the tab
+            hasn't been built yet.
+        """
+        if not self._settings_tab_built:
+            return (self._opentoonz_path or "").strip()
+        return self._opentoonz_path_edit.text().strip()
     
     def _get_opentoonz_placeholder(self) -> str:
         """Get placeholder text for OpenToonz path based on OS."""
-        if sys.platform == "win32":
-            return "C:\\Program Files\\OpenToonz\\OpenToonz.exe"
-        elif sys.platform == "darwin":
-            return "/Applications/OpenToonz.app/Contents/MacOS/OpenToonz"
-        else:
-            return "/usr/bin/opentoonz"
+        return _PLACEHOLDER
     
     def _get_os_info_text(self) -> str:
         """Get informational text about the current OS."""
-        if sys.platform == "win32":
-            return "Detected OS: Windows. Looking for OpenToonz.exe"
-        elif sys.platform == "darwin":
-            return "Detected OS: macOS. Looking for OpenToonz.app"
-        else:
-            return f"Detected OS: {sys.platform}. Looking for opentoonz binary"
+        return _OS_INFO
     
     def _connect_signals(self):
         """Connect UI signals to slots."""
-        self._browse_toonz_button.clicked.connect(self._browse_opentoonz)
         self._browse_output_button.clicked.connect(self._browse_output)
     
     def _load_initial_paths(self):
         """Load saved paths into the UI."""
-        if self._opentoonz_path:
-            self._opentoonz_path_edit.setText(self._opentoonz_path)
-        
         if self._export_path:
             self._output_path_edit.setText(self._export_path)
         
@@ -289,41 +459,44 @@ class OpenToonzExportDialog(QDialog):
             self._filename_edit.setText("new_scene")
 
         # Load persisted option states (handle string/boolean variants)
-        def _read_bool(key, default):
-            val = self._settings.value(key, default)
-            if isinstance(val, str):
-                return val.lower() in ("1", "true", "yes", "on")
-            return bool(val)
-
         try:
-            self._flatten_groups_checkbox.setChecked(
-                _read_bool(SETTINGS_FLATTEN_GROUPS, self._flatten_groups_checkbox.isChecked())
-            )
-            self._invisible_checkbox.setChecked(
-                _read_bool(SETTINGS_INCLUDE_INVISIBLE, self._invisible_checkbox.isChecked())
-            )
-            self._reference_checkbox.setChecked(
-                _read_bool(SETTINGS_INCLUDE_REFERENCE, self._reference_checkbox.isChecked())
-            )
-            self._static_checkbox.setChecked(
-                _read_bool(SETTINGS_INCLUDE_STATIC, self._static_checkbox.isChecked())
-            )
+            self._flatten_groups_checkbox.setChecked(_read_bool_setting(
+                self._cache, SETTINGS_FLATTEN_GROUPS, self._flatten_groups_checkbox.isChecked()
+            ))
+            self._invisible_checkbox.setChecked(_read_bool_setting(
+                self._cache, SETTINGS_INCLUDE_INVISIBLE, self._invisible_checkbox.isChecked()
+            ))
+            self._reference_checkbox.setChecked(_read_bool_setting(
+                self._cache, SETTINGS_INCLUDE_REFERENCE, self._reference_checkbox.isChecked()
+            ))
+            self._static_checkbox.setChecked(_read_bool_setting(
+                self._cache, SETTINGS_INCLUDE_STATIC, self._static_checkbox.isChecked()
+            ))
         except Exception:
             # If settings are missing or of unexpected type, ignore and keep defaults
             pass
     
+    def _get_option_states(self) -> dict:
+        """Get the export option checkbox states.
+        
+        Returns:
+            Dict mapping settings keys to checkbox states.
+        """
+        return {
+            SETTINGS_FLATTEN_GROUPS: self._flatten_groups_checkbox.isChecked(),
+            SETTINGS_INCLUDE_INVISIBLE: self._invisible_checkbox.isChecked(),
+            SETTINGS_INCLUDE_REFERENCE: self._reference_checkbox.isChecked(),
+            SETTINGS_INCLUDE_STATIC: self._static_checkbox.isChecked(),
+        }
+    
     def _browse_opentoonz(self):
         """Open file dialog to select OpenToonz executable."""
-        start_dir = ""
         current_path = self._opentoonz_path_edit.text()
-        if current_path and os.path.exists(os.path.dirname(current_path)):
-            start_dir = os.path.dirname(current_path)
-        elif sys.platform == "win32":
-            start_dir = "C:\\Program Files"
-        elif sys.platform == "darwin":
-            start_dir = "/Applications"
+        dirname = os.path.dirname(current_path) if current_path else ""
+        if dirname and os.path.isdir(dirname):
+            start_dir = dirname
         else:
-            start_dir = "/usr"
+            start_dir = _DEFAULT_BROWSE_DIR
         
         file_filter = get_opentoonz_executable_filter()
         
@@ -357,7 +530,7 @@ class OpenToonzExportDialog(QDialog):
             True if all inputs are valid, False otherwise.
         """
         # OpenToonz path is required for script execution
-        opentoonz_path = self._opentoonz_path_edit.text().strip()
+        opentoonz_path = self._get_opentoonz_path()
         if not opentoonz_path:
             QMessageBox.warning(
                 self,
@@ -402,12 +575,11 @@ class OpenToonzExportDialog(QDialog):
             return False
         
         # Check for invalid characters in filename
-        invalid_chars = '<>:"/\\|?*'
-        if any(c in filename for c in invalid_chars):
+        if _INVALID_FILENAME_RE.search(filename):
             QMessageBox.warning(
                 self,
                 "Invalid Filename",
-                f"Filename cannot contain these characters: {invalid_chars}"
+                f"Filename cannot contain these characters: {_INVALID_FILENAME_CHARS}"
             )
             return False
         
@@ -415,21 +587,19 @@ class OpenToonzExportDialog(QDialog):
     
     def _save_settings(self):
         """Save current settings for next time."""
-        opentoonz_path = self._opentoonz_path_edit.text().strip()
+        opentoonz_path = self._get_opentoonz_path()
         if opentoonz_path:
-            self._settings.setValue(SETTINGS_OPENTOONZ_PATH, opentoonz_path)
+            self._cache.set(SETTINGS_OPENTOONZ_PATH, opentoonz_path)
         
         output_path = self._output_path_edit.text().strip()
         if output_path:
-            self._settings.setValue(SETTINGS_EXPORT_PATH, output_path)
-        # Save export option states
-        try:
-            self._settings.setValue(SETTINGS_FLATTEN_GROUPS, int(self._flatten_groups_checkbox.isChecked()))
-            self._settings.setValue(SETTINGS_INCLUDE_INVISIBLE, int(self._invisible_checkbox.isChecked()))
-            self._settings.setValue(SETTINGS_INCLUDE_REFERENCE, int(self._reference_checkbox.isChecked()))
-            self._settings.setValue(SETTINGS_INCLUDE_STATIC, int(self._static_checkbox.isChecked()))
-        except Exception:
-            pass
+            self._cache.set(SETTINGS_EXPORT_PATH, output_path)
+        # Save export option states; unchanged values aren't written
+        for key, checked in self._get_option_states().items():
+            self._cache.set(key, checked)
+        
+        # Write only the changed values, with a single sync
+        self._cache.flush()
     
     def _on_export(self):
         """Handle export button click."""
@@ -446,7 +616,7 @@ class OpenToonzExportDialog(QDialog):
         
         self._save_settings()
         
-        opentoonz_path = self._opentoonz_path_edit.text().strip()
+        opentoonz_path = self._get_opentoonz_path()
         output_path = self._output_path_edit.text().strip()
         scene_name = self._filename_edit.text().strip()
         
@@ -478,23 +648,43 @@ class OpenToonzExportDialog(QDialog):
             0, 100,
             self
         )
-        progress.setWindowModality(get_window_modality())
+        progress.setWindowModality(WINDOW_MODAL)
         progress.setMinimumDuration(0)
         progress.setValue(0)
         
         cancelled = False
+        last_percent = -1
+        last_message = ""
+        last_pump = time.monotonic()
         
         def on_progress(current, total, message):
-            if total > 0:
-                progress.setValue(int(current / total * 100))
-            progress.setLabelText(message)
+            # Update the dialog only when the percentage advances (or, without
+            # a total, the message changes); otherwise just keep the UI
+            # responsive by processing events every _PROGRESS_PUMP_INTERVAL
+            nonlocal last_percent, last_message, last_pump
+            percent = int(current / total * 100) if total > 0 else last_percent
+            now = time.monotonic()
+            if percent != last_percent or (total <= 0 and message != last_message):
+                if total > 0:
+                    progress.setValue(percent)
+                progress.setLabelText(message)
+                last_percent = percent
+                last_message = message
+            elif now - last_pump <= _PROGRESS_PUMP_INTERVAL:
+                return
             QApplication.processEvents()
+            last_pump = now
         
         def on_cancelled():
             nonlocal cancelled
             cancelled = progress.wasCanceled()
             return cancelled
         
+        # Import the exporter on first use, so opening the dialog doesn't
+        # load it (and NumPy/Pillow) before an export is started
+        from .tnz_exporter import TNZExporter
+        from .core.exporter import ExportOptions
+        
         try:
             # Build export options from UI state
             options = ExportOptions()
@@ -537,6 +727,8 @@ class OpenToonzExportDialog(QDialog):
                     f"Location: {full_tnz_path}\n"
                     f"Layers: {layer_count}\n"
                     f"Frames exported: {frame_count}"
+                    + ("\n\nOpenToonz did not exit on its own and was closed."
+                       if result.get('killed') else "")
                 )
                 self.accept()
             else: